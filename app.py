@@ -8,6 +8,7 @@ import logging
 from urllib.parse import urlparse, urljoin
 import smtplib
 from email.mime.text import MIMEText
+from checkpoints import load_campaign, record_send, save_page, read_page, is_ready_to_send, summarize_campaign, run_campaign
 
 # Initialize OpenAI API key
 if "openai_api_key" not in st.session_state:
@@ -85,118 +86,180 @@ show_settings()
 
 st.title("Domain Scraper with Email Extraction and Personalized Outreach")
 
+campaign = st.text_input("Campaign name", "default")
 domains = st.text_area("Enter domains (one per line)")
 
-def scrape_domains(domains):
-    domain_data = []
-    for domain in domains.split("\n"):
+def fetch_domain(campaign, record):
+    domain = record["key"]
+    parsed_url = urlparse(domain)
+    if not parsed_url.scheme:
+        url = f"https://{domain}"
+    else:
+        url = domain
+
+    response = requests.get(url)
+    response.raise_for_status()  # Raise an exception for non-2xx status codes
+
+    save_page(campaign, domain, response.text)
+
+    return {"url": url, "domain": parsed_url.netloc}
+
+def extract_domain(campaign, record):
+    url = record["url"]
+    domain_name = record["domain"]
+    html = read_page(campaign, record["key"])
+    soup = BeautifulSoup(html, "html.parser")
+
+    page_title = soup.find("title").get_text()
+    meta_description = soup.find("meta", attrs={"name":"description"}).get("content", "")
+    main_text = " ".join([p.get_text() for p in soup.find_all("p")])
+
+    # Extract email addresses using multiple methods
+    emails = set()
+
+    # Method 1: Regular expression on HTML content
+    emails.update(re.findall(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", html))
+
+    # Method 2: mailto: links
+    mailto_links = soup.find_all("a", href=re.compile(r"mailto:"))
+    emails.update([link.get("href").replace("mailto:", "") for link in mailto_links])
+
+    # Method 3: Text content of HTML elements
+    for element in soup.find_all(text=re.compile(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+"), recursive=True):
+        emails.add(str(element))
+
+    # Method 4: HTML attributes
+    for tag in soup.find_all(True):
+        for attr in tag.attrs.values():
+            emails.update(re.findall(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", str(attr)))
+
+    # Method 5: Find "Contact Us" page and extract emails
+    contact_links = soup.find_all("a", string=re.compile(r"Contact( Us)?", re.IGNORECASE))
+    for link in contact_links:
+        contact_url = urljoin(url, link.get("href"))
         try:
-            parsed_url = urlparse(domain)
-            if not parsed_url.scheme:
-                url = f"https://{domain}"
-            else:
-                url = domain
-
-            response = requests.get(url)
-            response.raise_for_status()  # Raise an exception for non-2xx status codes
-            soup = BeautifulSoup(response.text, "html.parser")
-
-            domain_name = parsed_url.netloc
-            page_title = soup.find("title").get_text()
-            meta_description = soup.find("meta", attrs={"name":"description"}).get("content", "")
-            main_text = " ".join([p.get_text() for p in soup.find_all("p")])
-
-            # Extract email addresses using multiple methods
-            emails = set()
-
-            # Method 1: Regular expression on HTML content
-            emails.update(re.findall(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", response.text))
-
-            # Method 2: mailto: links
-            mailto_links = soup.find_all("a", href=re.compile(r"mailto:"))
-            emails.update([link.get("href").replace("mailto:", "") for link in mailto_links])
-
-            # Method 3: Text content of HTML elements
-            for element in soup.find_all(text=re.compile(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+"), recursive=True):
-                emails.add(element)
-
-            # Method 4: HTML attributes
-            for tag in soup.find_all(True):
-                for attr in tag.attrs.values():
-                    emails.update(re.findall(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", str(attr)))
-
-            # Method 5: Find "Contact Us" page and extract emails
-            contact_links = soup.find_all("a", string=re.compile(r"Contact( Us)?", re.IGNORECASE))
-            for link in contact_links:
-                contact_url = urljoin(url, link.get("href"))
-                try:
-                    contact_response = requests.get(contact_url)
-                    contact_response.raise_for_status()
-                    contact_soup = BeautifulSoup(contact_response.text, "html.parser")
-                    emails.update(re.findall(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", contact_soup.get_text()))
-                except Exception as e:
-                    st.warning(f"Error retrieving contact page for {domain_name}: {e}")
-
-            # Convert the set to a list
-            emails = list(emails)
-
-            # Generate personalized outreach using OpenAI API
-            prompt = f"Based on the following information about the website {domain_name}:\n\nTitle: {page_title}\nDescription: {meta_description}\nMain Text: {main_text[:500]}...\n\nCraft a personalized email outreach for a backlink opportunity. The email should be friendly, engaging, and highlight the relevance of the website's content to our business. Keep the email concise and actionable.\n\nAdditionally, please include a signature with the following details:\n\nName: {st.session_state.user_info['name']}\nBusiness Name: {st.session_state.user_info['business_name']}\nWebsite: {st.session_state.user_info['website']}\nBusiness Description: {st.session_state.user_info['business_description']}\nEmail: {st.session_state.user_info['email']}\nPhone Number: {st.session_state.user_info['phone_number']}"
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {st.session_state.openai_api_key}"
-            }
-            data = {
-                "model": "gpt-3.5-turbo",
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": 500,
-                "n": 1,
-                "stop": None,
-                "temperature": 0.7
-            }
-            response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=data)
-            response.raise_for_status()
-            outreach_email = response.json()["choices"][0]["message"]["content"].strip()
-
-            # Ask OpenAI to suggest the best email for outreach
-            email_prompt = f"Here are the email addresses found on the website {domain_name}:\n\n{', '.join(emails)}\n\nBased on the website content and the personalized outreach email, which email address would be the most appropriate to send the outreach to? Please make sure to only respond with the suggested email, nothing else!"
-            email_data = {
-                "model": "gpt-3.5-turbo",
-                "messages": [{"role": "user", "content": email_prompt}, {"role": "assistant", "content": outreach_email}],
-                "max_tokens": 100,
-                "n": 1,
-                "stop": None,
-                "temperature": 0.7
-            }
-            email_response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=email_data)
-            email_response.raise_for_status()
-            suggested_email = email_response.json()["choices"][0]["message"]["content"].strip()
-
-            domain_data.append({
-                "domain": domain_name,
-                "outreach_email": outreach_email,
-                "suggested_email": suggested_email
-            })
-        except requests.exceptions.RequestException as e:
-            st.error(f"Error scraping data for {domain}: {e}")
-            logging.error(f"Error scraping {domain}: {e}")
+            contact_response = requests.get(contact_url)
+            contact_response.raise_for_status()
+            contact_soup = BeautifulSoup(contact_response.text, "html.parser")
+            emails.update(re.findall(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", contact_soup.get_text()))
         except Exception as e:
-            st.error(f"Error scraping data for {domain}: {e}")
-            logging.error(f"Error scraping {domain}: {e}")
+            st.warning(f"Error retrieving contact page for {domain_name}: {e}")
+
+    return {
+        "page_title": page_title,
+        "meta_description": meta_description,
+        "main_text": main_text,
+        "emails": list(emails)
+    }
+
+def openai_headers():
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {st.session_state.openai_api_key}"
+    }
 
-    return domain_data
+def draft_outreach(campaign, record):
+    # Generate personalized outreach using OpenAI API
+    prompt = f"Based on the following information about the website {record['domain']}:\n\nTitle: {record['page_title']}\nDescription: {record['meta_description']}\nMain Text: {record['main_text'][:500]}...\n\nCraft a personalized email outreach for a backlink opportunity. The email should be friendly, engaging, and highlight the relevance of the website's content to our business. Keep the email concise and actionable.\n\nAdditionally, please include a signature with the following details:\n\nName: {st.session_state.user_info['name']}\nBusiness Name: {st.session_state.user_info['business_name']}\nWebsite: {st.session_state.user_info['website']}\nBusiness Description: {st.session_state.user_info['business_description']}\nEmail: {st.session_state.user_info['email']}\nPhone Number: {st.session_state.user_info['phone_number']}"
+    data = {
+        "model": "gpt-3.5-turbo",
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": 500,
+        "n": 1,
+        "stop": None,
+        "temperature": 0.7
+    }
+    response = requests.post("https://api.openai.com/v1/chat/completions", headers=openai_headers(), json=data)
+    response.raise_for_status()
+    outreach_email = response.json()["choices"][0]["message"]["content"].strip()
+
+    return {"outreach_email": outreach_email}
+
+def rank_emails(campaign, record):
+    # Ask OpenAI to suggest the best email for outreach
+    email_prompt = f"Here are the email addresses found on the website {record['domain']}:\n\n{', '.join(record['emails'])}\n\nBased on the website content and the personalized outreach email, which email address would be the most appropriate to send the outreach to? Please make sure to only respond with the suggested email, nothing else!"
+    email_data = {
+        "model": "gpt-3.5-turbo",
+        "messages": [{"role": "user", "content": email_prompt}, {"role": "assistant", "content": record["outreach_email"]}],
+        "max_tokens": 100,
+        "n": 1,
+        "stop": None,
+        "temperature": 0.7
+    }
+    email_response = requests.post("https://api.openai.com/v1/chat/completions", headers=openai_headers(), json=email_data)
+    email_response.raise_for_status()
+    suggested_email = email_response.json()["choices"][0]["message"]["content"].strip()
+
+    return {"suggested_email": suggested_email}
+
+# Each stage moves a domain from the state it is keyed by to the next one in DOMAIN_STATES
+DOMAIN_STAGES = {
+    "queued": fetch_domain,
+    "fetched": extract_domain,
+    "extracted": draft_outreach,
+    "drafted": rank_emails
+}
+
+def to_domain_data(record, campaign):
+    return {
+        "campaign": campaign,
+        "key": record["key"],
+        "domain": record["domain"],
+        "state": record["state"],
+        "error": record.get("error"),
+        "outreach_email": record["outreach_email"],
+        "suggested_email": record["suggested_email"]
+    }
+
+def scrape_domains(domains, campaign):
+    records = st.session_state.campaign_records
+    processed = run_campaign(records, domains, campaign, DOMAIN_STAGES, on_error=lambda domain, e: st.error(f"Error scraping data for {domain}: {e}"))
+    return [to_domain_data(record, campaign) for record in processed if is_ready_to_send(record)]
+
+def show_campaign_status():
+    records = st.session_state.campaign_records
+    if not records:
+        return
+    st.subheader(f"Campaign status: {st.session_state.loaded_campaign}")
+    counts = summarize_campaign(records)
+    cols = st.columns(len(counts))
+    for col, (state, count) in zip(cols, counts.items()):
+        col.metric(state.capitalize(), count)
+    failed = [record for record in records.values() if record["state"] == "failed"]
+    if failed:
+        with st.expander(f"Failed domains ({len(failed)})"):
+            for record in failed:
+                st.write(f"**{record['key']}** (resumes from {record['resume_from']}): {record.get('error', '')}")
 
 def show_domain_data():
     if st.session_state.domain_data:
         cols = st.columns(3)
         for i, data in enumerate(st.session_state.domain_data):
             with cols[i % 3].expander(data["domain"]):
-                outreach_subject = st.text_input(f"Subject for {data['domain']}", f"Backlink Opportunity for {data['domain']}", key=f"subject_{data['domain']}")
-                outreach_email = st.text_area(f"Outreach Email for {data['domain']}", data["outreach_email"], height=200, key=f"outreach_email_{data['domain']}")
-                selected_email = st.text_input(f"Email to send outreach for {data['domain']}", data["suggested_email"], key=f"selected_email_{data['domain']}")
-                send_email = st.checkbox(f"Send Email for {data['domain']}", key=f"send_email_{data['domain']}")
-                if send_email:
-                    send_outreach_email(data, outreach_subject, outreach_email, selected_email)
+                if data["state"] == "sent":
+                    st.success(f"Outreach already sent for {data['domain']}.")
+                    continue
+                if data["state"] == "failed":
+                    st.warning(f"Last attempt failed: {data['error']}")
+                outreach_subject = st.text_input(f"Subject for {data['domain']}", f"Backlink Opportunity for {data['domain']}", key=f"subject_{data['key']}")
+                outreach_email = st.text_area(f"Outreach Email for {data['domain']}", data["outreach_email"], height=200, key=f"outreach_email_{data['key']}")
+                selected_email = st.text_input(f"Email to send outreach for {data['domain']}", data["suggested_email"], key=f"selected_email_{data['key']}")
+                # A button only fires on the click itself, so reruns never resend or retry
+                if st.button(f"Send Email for {data['domain']}", key=f"send_email_{data['key']}"):
+                    record = None
+                    if st.session_state.loaded_campaign == data["campaign"]:
+                        record = st.session_state.campaign_records.get(data["key"])
+                    if record is None:
+                        st.error(f"No checkpoint found for {data['domain']} in campaign {data['campaign']}, not sending.")
+                        continue
+                    sent = send_outreach_email(data, outreach_subject, outreach_email, selected_email)
+                    try:
+                        record_send(data["campaign"], record, sent, selected_email)
+                    except Exception as e:
+                        st.error(f"Error checkpointing {data['domain']}: {e}")
+                        logging.error(f"Error checkpointing {data['domain']}: {e}")
+                    data["state"] = record["state"]
+                    data["error"] = record.get("error")
     else:
         st.warning("No domain data available. Please scrape some domains first.")
 
@@ -230,7 +293,16 @@ def send_outreach_email(domain_data, outreach_subject, outreach_email, selected_
     if success_count > 0:
         st.success(f"Email sent successfully!")
 
+    return success_count > 0
+
+# Restore the campaign from its checkpoint whenever a different one is selected
+if st.session_state.get("loaded_campaign") != campaign:
+    st.session_state.campaign_records = load_campaign(campaign)
+    st.session_state.loaded_campaign = campaign
+    st.session_state.domain_data = [to_domain_data(record, campaign) for record in st.session_state.campaign_records.values() if is_ready_to_send(record)]
+
 if st.button("Scrape Domains"):
-    st.session_state.domain_data = scrape_domains(domains)
+    st.session_state.domain_data = scrape_domains(domains, campaign)
 
+show_campaign_status()
 show_domain_data()
@@ -0,0 +1,163 @@
+import re
+import os
+import json
+import hashlib
+import logging
+
+# Campaign checkpoints are stored here, one append-only log per campaign
+CAMPAIGN_DIR = "campaigns"
+
+# Every domain moves through these states in order, or to "failed" on error
+DOMAIN_STATES = ["queued", "fetched", "extracted", "drafted", "ranked", "sent"]
+
+def campaign_path(campaign):
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", campaign.strip()) or "default"
+    return os.path.join(CAMPAIGN_DIR, f"{safe_name}.jsonl")
+
+def page_path(campaign, key):
+    # Fetched pages live outside the log so the log never holds raw HTML
+    page_dir = campaign_path(campaign)[:-len(".jsonl")] + "_pages"
+    return os.path.join(page_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".html")
+
+def save_page(campaign, key, html):
+    path = page_path(campaign, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(html)
+
+def read_page(campaign, key):
+    with open(page_path(campaign, key), "r", encoding="utf-8") as f:
+        return f.read()
+
+def delete_page(campaign, key):
+    try:
+        os.remove(page_path(campaign, key))
+    except FileNotFoundError:
+        pass
+
+def write_campaign(campaign, records):
+    # Rewrite the log as one line per domain, replacing the old file atomically
+    os.makedirs(CAMPAIGN_DIR, exist_ok=True)
+    path = campaign_path(campaign)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in records.values():
+            f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def load_campaign(campaign):
+    # Replay the checkpoint log, the last record written for a domain wins
+    records = {}
+    path = campaign_path(campaign)
+    if not os.path.exists(path):
+        return records
+    line_count = 0
+    corrupt = False
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line_count += 1
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = None
+            if not isinstance(record, dict) or "key" not in record:
+                # A crash mid-write can leave a truncated last line
+                logging.warning(f"Skipping corrupt checkpoint line in {path}")
+                corrupt = True
+                continue
+            records[record["key"]] = record
+
+    # Compact the log so it doesn't grow with every transition, this also drops a torn tail
+    if corrupt or line_count > len(records):
+        write_campaign(campaign, records)
+    return records
+
+def checkpoint_domain(campaign, record):
+    os.makedirs(CAMPAIGN_DIR, exist_ok=True)
+    path = campaign_path(campaign)
+    with open(path, "ab") as f:
+        # Never append onto a partial line left behind by a crash
+        if f.tell() > 0:
+            with open(path, "rb") as tail:
+                tail.seek(-1, os.SEEK_END)
+                if tail.read(1) != b"\n":
+                    f.write(b"\n")
+        f.write((json.dumps(record) + "\n").encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+
+def transition_domain(campaign, record, state, **fields):
+    record.update(fields)
+    if state == "failed":
+        # Remember where to pick up again, a repeated failure keeps the original resume point
+        record["resume_from"] = current_state(record)
+    else:
+        record.pop("resume_from", None)
+        record.pop("error", None)
+    record["state"] = state
+    checkpoint_domain(campaign, record)
+
+def current_state(record):
+    return record["resume_from"] if record["state"] == "failed" else record["state"]
+
+def is_ready_to_send(record):
+    # Ranked domains, including those whose send failed, can be (re)sent from the UI
+    return current_state(record) in ("ranked", "sent")
+
+def summarize_campaign(records):
+    counts = {state: 0 for state in DOMAIN_STATES + ["failed"]}
+    for record in records.values():
+        counts[record["state"]] += 1
+    return counts
+
+def record_send(campaign, record, sent, sent_to):
+    # Checkpoint the outcome of a send attempt from the UI
+    if sent:
+        transition_domain(campaign, record, "sent", sent_to=sent_to)
+    else:
+        transition_domain(campaign, record, "failed", error="No SMTP configuration could send the email")
+
+def run_campaign(records, domains, campaign, stages, on_error=None):
+    # Drive every domain through the stages, skipping the ones already completed
+    processed = []
+    seen = set()
+    for domain in domains.split("\n"):
+        domain = domain.strip()
+        if not domain or domain in seen:
+            continue
+        seen.add(domain)
+
+        record = records.get(domain)
+        try:
+            if record is None:
+                record = {"key": domain, "state": "queued"}
+                records[domain] = record
+                checkpoint_domain(campaign, record)
+
+            # Failed domains stay failed until a stage succeeds, so the log and the UI agree
+            stage_state = current_state(record)
+
+            # The fetched page is gone if extraction was checkpointed but never finished
+            if stage_state == "fetched" and not os.path.exists(page_path(campaign, domain)):
+                stage_state = "queued"
+
+            while stage_state in stages:
+                fields = stages[stage_state](campaign, record)
+                stage_state = DOMAIN_STATES[DOMAIN_STATES.index(stage_state) + 1]
+                transition_domain(campaign, record, stage_state, **fields)
+                if stage_state == "extracted":
+                    delete_page(campaign, domain)
+        except Exception as e:
+            logging.error(f"Error scraping {domain}: {e}")
+            if on_error is not None:
+                on_error(domain, e)
+            try:
+                transition_domain(campaign, record, "failed", error=str(e))
+            except Exception as checkpoint_error:
+                logging.error(f"Error checkpointing {domain}: {checkpoint_error}")
+
+        processed.append(record)
+
+    return processed
@@ -0,0 +1,227 @@
+import json
+import os
+
+import pytest
+
+import checkpoints
+from checkpoints import (
+    campaign_path,
+    checkpoint_domain,
+    is_ready_to_send,
+    load_campaign,
+    page_path,
+    record_send,
+    run_campaign,
+    save_page,
+    transition_domain,
+)
+
+
+@pytest.fixture(autouse=True)
+def campaign_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoints, "CAMPAIGN_DIR", str(tmp_path))
+    return tmp_path
+
+
+def read_lines(campaign):
+    with open(campaign_path(campaign), "r", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def test_load_missing_campaign_is_empty():
+    assert load_campaign("nothing") == {}
+
+
+def test_load_replays_last_record_per_key_and_compacts():
+    checkpoint_domain("c", {"key": "a", "state": "queued"})
+    checkpoint_domain("c", {"key": "b", "state": "queued"})
+    checkpoint_domain("c", {"key": "a", "state": "fetched"})
+
+    records = load_campaign("c")
+
+    assert records == {"a": {"key": "a", "state": "fetched"}, "b": {"key": "b", "state": "queued"}}
+    assert len(read_lines("c")) == 2
+
+
+def test_load_skips_torn_tail_and_non_record_lines():
+    checkpoint_domain("c", {"key": "a", "state": "ranked"})
+    with open(campaign_path("c"), "a", encoding="utf-8") as f:
+        f.write("[1, 2]\n42\n")
+        f.write('{"key": "a", "sta')
+
+    assert load_campaign("c") == {"a": {"key": "a", "state": "ranked"}}
+    assert read_lines("c") == [json.dumps({"key": "a", "state": "ranked"})]
+
+
+def test_append_after_torn_tail_keeps_new_record():
+    checkpoint_domain("c", {"key": "a", "state": "ranked"})
+    with open(campaign_path("c"), "a", encoding="utf-8") as f:
+        f.write('{"key": "a", "sta')
+
+    transition_domain("c", {"key": "a", "state": "ranked"}, "sent")
+
+    assert load_campaign("c")["a"]["state"] == "sent"
+
+
+def test_transition_sets_and_clears_resume_from():
+    record = {"key": "a", "state": "extracted"}
+
+    transition_domain("c", record, "failed", error="boom")
+    assert record["state"] == "failed"
+    assert record["resume_from"] == "extracted"
+    assert record["error"] == "boom"
+    assert load_campaign("c")["a"] == record
+
+    record["state"] = record["resume_from"]
+    transition_domain("c", record, "drafted", outreach_email="hi")
+    assert record == {"key": "a", "state": "drafted", "outreach_email": "hi"}
+
+
+def test_repeated_failure_keeps_resume_point():
+    record = {"key": "a", "state": "ranked"}
+
+    transition_domain("c", record, "failed", error="first")
+    transition_domain("c", record, "failed", error="second")
+
+    assert record["resume_from"] == "ranked"
+    assert record["error"] == "second"
+    assert load_campaign("c")["a"]["resume_from"] == "ranked"
+
+
+def test_record_send_marks_sent_or_failed():
+    record = {"key": "a", "state": "ranked"}
+
+    record_send("c", record, False, "x@d")
+    assert record["state"] == "failed"
+    assert record["resume_from"] == "ranked"
+
+    record_send("c", record, True, "x@d")
+    assert record == {"key": "a", "state": "sent", "sent_to": "x@d"}
+    assert load_campaign("c")["a"] == record
+
+
+def test_send_retry_after_reload():
+    record_send("c", {"key": "a", "state": "ranked"}, False, "x@d")
+
+    record = load_campaign("c")["a"]
+    record_send("c", record, False, "x@d")
+    record = load_campaign("c")["a"]
+
+    assert record["state"] == "failed"
+    assert record["resume_from"] == "ranked"
+    assert is_ready_to_send(record)
+
+    record_send("c", record, True, "x@d")
+    assert load_campaign("c")["a"]["state"] == "sent"
+
+
+def test_is_ready_to_send_includes_failed_sends():
+    assert is_ready_to_send({"state": "ranked"})
+    assert is_ready_to_send({"state": "sent"})
+    assert is_ready_to_send({"state": "failed", "resume_from": "ranked"})
+    assert not is_ready_to_send({"state": "failed", "resume_from": "drafted"})
+
+
+class StubStages:
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+
+    def stage(self, name, fields):
+        def run(campaign, record):
+            self.calls.append((record["key"], name))
+            if (record["key"], name) in self.fail:
+                raise RuntimeError(f"{name} failed")
+            if name == "fetch":
+                save_page(campaign, record["key"], "<html></html>")
+            return fields
+        return run
+
+    def as_dict(self):
+        return {
+            "queued": self.stage("fetch", {"domain": "d"}),
+            "fetched": self.stage("extract", {"emails": []}),
+            "extracted": self.stage("draft", {"outreach_email": "hi"}),
+            "drafted": self.stage("rank", {"suggested_email": "a@d"}),
+        }
+
+
+def test_run_campaign_skips_completed_and_resumes_failed():
+    stubs = StubStages(fail={("b", "draft")})
+    errors = []
+    processed = run_campaign({}, "a\n\nb\n", "c", stubs.as_dict(), on_error=lambda domain, e: errors.append(domain))
+
+    assert [record["state"] for record in processed] == ["ranked", "failed"]
+    assert processed[1]["resume_from"] == "extracted"
+    assert errors == ["b"]
+
+    checkpoint_domain("c", {"key": "s", "state": "sent"})
+    stubs.calls.clear()
+    stubs.fail.clear()
+    records = load_campaign("c")
+    processed = run_campaign(records, "a\nb\ns", "c", stubs.as_dict())
+
+    assert stubs.calls == [("b", "draft"), ("b", "rank")]
+    assert [record["state"] for record in processed] == ["ranked", "ranked", "sent"]
+    assert load_campaign("c")["b"]["state"] == "ranked"
+
+
+def test_run_campaign_never_checkpoints_fetched_html():
+    run_campaign({}, "a", "c", StubStages().as_dict())
+
+    assert "<html>" not in "".join(read_lines("c"))
+    assert not os.path.exists(page_path("c", "a"))
+
+
+def test_run_campaign_refetches_when_page_is_missing():
+    checkpoint_domain("c", {"key": "a", "state": "fetched", "domain": "d"})
+    stubs = StubStages()
+
+    run_campaign(load_campaign("c"), "a", "c", stubs.as_dict())
+
+    assert stubs.calls[0] == ("a", "fetch")
+
+
+def test_run_campaign_survives_checkpoint_errors(monkeypatch):
+    def broken_checkpoint(campaign, record):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(checkpoints, "checkpoint_domain", broken_checkpoint)
+    stubs = StubStages()
+
+    processed = run_campaign({}, "a\nb", "c", stubs.as_dict())
+
+    assert [record["key"] for record in processed] == ["a", "b"]
+
+
+def test_run_campaign_leaves_failed_send_untouched():
+    record_send("c", {"key": "a", "state": "ranked"}, False, "x@d")
+    stubs = StubStages()
+    records = load_campaign("c")
+
+    processed = run_campaign(records, "a", "c", stubs.as_dict())
+
+    assert stubs.calls == []
+    assert processed[0]["state"] == "failed"
+    assert processed[0]["resume_from"] == "ranked"
+    assert processed[0]["error"]
+    assert load_campaign("c")["a"] == processed[0]
+
+
+def test_run_campaign_keeps_failed_until_stage_succeeds():
+    checkpoint_domain("c", {"key": "a", "state": "failed", "resume_from": "extracted", "error": "boom"})
+    stubs = StubStages(fail={("a", "draft")})
+
+    processed = run_campaign(load_campaign("c"), "a", "c", stubs.as_dict())
+
+    assert processed[0]["state"] == "failed"
+    assert processed[0]["resume_from"] == "extracted"
+
+
+def test_run_campaign_dedupes_domains():
+    stubs = StubStages()
+
+    processed = run_campaign({}, "a\n a \na", "c", stubs.as_dict())
+
+    assert [record["key"] for record in processed] == ["a"]
+    assert [call for call in stubs.calls if call[1] == "fetch"] == [("a", "fetch")]